@@ -0,0 +1,371 @@
+"""
+Shared meal loading and aggregation for the nutrition scripts
+JSON/NDJSON readers, one fused pass over the meals, plus NumPy column reductions
+"""
+
+import heapq
+import json
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Any, Iterable, Iterator, NamedTuple, Optional, Tuple
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+MACRO_KEYS = ('calories', 'protein', 'carbs', 'fat', 'fiber')
+
+
+def loads(data: bytes) -> Any:
+    """Decode JSON bytes, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def decode_meals(data: bytes) -> List[Dict[str, Any]]:
+    """Decode a JSON array of meals, or NDJSON (one meal per line) as written by meal_tracker.py"""
+    if data[:1024].lstrip()[:1] == b'[':
+        return loads(data)
+    return [loads(line) for line in data.splitlines() if line.strip()]
+
+
+def stream_meals(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield meals from a JSON array (via ijson) or an NDJSON file one at a time"""
+    with open(path, 'rb') as f:
+        if f.peek(1024)[:1024].lstrip()[:1] == b'[':
+            yield from ijson.items(f, 'item', use_float=True)
+            return
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+def load_meals(path: str, stream: bool = False) -> Optional[List[Dict[str, Any]]]:
+    """Read every meal in path, or return None when they will be streamed instead
+    
+    Stream mode falls back to a whole-file load without ijson; an unreadable
+    file ends the script.
+    """
+    if stream:
+        if ijson is not None:
+            print(f"✓ Streaming meals from {path}")
+            return None
+        print("Note: ijson not installed, loading the whole file instead")
+    
+    try:
+        with open(path, 'rb') as f:
+            return decode_meals(f.read())
+    except Exception as e:
+        print(f"✗ Error loading data: {e}")
+        sys.exit(1)
+
+
+if sys.version_info >= (3, 11):
+    # fromisoformat accepts a trailing 'Z' natively from 3.11 on
+    parse_ts = datetime.fromisoformat
+else:
+    def parse_ts(s: str) -> datetime:
+        """Parse an ISO timestamp, accepting a trailing 'Z'"""
+        return datetime.fromisoformat(s[:-1] + '+00:00' if s.endswith('Z') else s)
+
+
+def _to_local(ts: datetime) -> datetime:
+    """Express an offset-aware timestamp as naive local time, comparable with now()"""
+    return ts if ts.tzinfo is None else ts.astimezone().replace(tzinfo=None)
+
+
+def meal_ts(meal: Dict[str, Any],
+            cache: Dict[int, Tuple[Dict[str, Any], datetime]] = None) -> datetime:
+    """Parsed consumedAt of a meal, memoized in cache by id(meal) when given
+    
+    Entries keep a reference to their meal, so an id cannot be reused by
+    another dict while its entry lives; don't pass a cache for streamed meals.
+    """
+    if cache is None:
+        return _to_local(parse_ts(meal.get('consumedAt', '')))
+    entry = cache.get(id(meal))
+    if entry is None:
+        entry = cache[id(meal)] = (meal, _to_local(parse_ts(meal.get('consumedAt', ''))))
+    return entry[1]
+
+
+class FoodAcc:
+    """Running tally for one food label"""
+    __slots__ = ('count', 'cal', 'prot')
+    
+    def __init__(self):
+        self.count = 0
+        self.cal = 0.0
+        self.prot = 0.0
+
+
+def _zero_totals() -> Dict[str, float]:
+    """Fresh all-zero totals keyed by MACRO_KEYS"""
+    return dict.fromkeys(MACRO_KEYS, 0)
+
+
+@dataclass
+class Aggregates:
+    """Everything the analyzer and report read, collected in one pass"""
+    meal_count: int = 0
+    meal_types: Counter = field(default_factory=Counter)
+    foods: Dict[str, FoodAcc] = field(default_factory=dict)
+    totals: Dict[str, float] = field(default_factory=_zero_totals)
+    recent_count: int = 0
+    recent: Dict[str, float] = field(default_factory=_zero_totals)
+    daily: Dict[str, Dict[str, float]] = field(default_factory=dict)
+
+
+def fuse_aggregate(meals: Iterable[Dict[str, Any]], cutoff: datetime = None,
+                   recent_after: datetime = None, with_totals: bool = True,
+                   by_day: bool = False,
+                   ts_cache: Dict[int, Tuple[Dict[str, Any], datetime]] = None) -> Aggregates:
+    """Count meal types and foods and sum macros in a single pass
+    
+    cutoff drops meals at or before it entirely; recent_after additionally
+    sums the meals after it into agg.recent; by_day fills agg.daily.
+    with_totals=False skips every macro sum, for when the NumPy helpers
+    below fill them from columns instead. ts_cache is handed to meal_ts().
+    """
+    agg = Aggregates()
+    # Loop-invariant bindings, so the body only touches locals
+    meal_types = agg.meal_types
+    foods = agg.foods
+    track_recent = with_totals and recent_after is not None
+    by_day = with_totals and by_day
+    need_ts = cutoff is not None or track_recent or by_day
+    meal_count = recent_count = 0
+    t_cal = t_prot = t_carbs = t_fat = t_fiber = 0
+    r_cal = r_prot = r_carbs = r_fat = r_fiber = 0
+    # Parallel per-day tallies; zipped into dicts after the loop
+    day_count, day_calories, day_protein, day_carbs, day_fat = (
+        Counter(), Counter(), Counter(), Counter(), Counter()
+    )
+    
+    for meal in meals:
+        if need_ts:
+            consumed_at = meal_ts(meal, ts_cache)
+            if cutoff is not None and consumed_at <= cutoff:
+                continue
+        
+        meal_count += 1
+        meal_types[meal.get('mealType', 'unknown')] += 1
+        
+        analysis = meal.get('analysisData') or {}
+        if with_totals:
+            try:
+                # Fast path: well-formed meals carry the full totals/macros path
+                meal_totals = analysis['totals']
+                macros = meal_totals['macros']
+                calories = meal_totals['calories_kcal']
+                protein = macros['protein_g']
+                carbs = macros['carbs_g']
+                fat = macros['fat_g']
+            except KeyError:
+                meal_totals = analysis.get('totals') or {}
+                macros = meal_totals.get('macros') or {}
+                
+                calories = meal_totals.get('calories_kcal', 0)
+                protein = macros.get('protein_g', 0)
+                carbs = macros.get('carbs_g', 0)
+                fat = macros.get('fat_g', 0)
+            fiber = macros.get('fiber_g', 0)
+            
+            t_cal += calories
+            t_prot += protein
+            t_carbs += carbs
+            t_fat += fat
+            t_fiber += fiber
+            
+            if track_recent and consumed_at > recent_after:
+                recent_count += 1
+                r_cal += calories
+                r_prot += protein
+                r_carbs += carbs
+                r_fat += fat
+                r_fiber += fiber
+            
+            if by_day:
+                date_str = consumed_at.strftime('%Y-%m-%d')
+                day_count[date_str] += 1
+                day_calories[date_str] += calories
+                day_protein[date_str] += protein
+                day_carbs[date_str] += carbs
+                day_fat[date_str] += fat
+        
+        for item in analysis.get('composition') or ():
+            label = item.get('label', 'unknown')
+            nutrition = item.get('nutrition') or {}
+            food = foods.get(label)
+            if food is None:
+                food = foods[label] = FoodAcc()
+            food.count += 1
+            food.cal += nutrition.get('calories_kcal', 0)
+            food.prot += (nutrition.get('macros') or {}).get('protein_g', 0)
+    
+    agg.meal_count = meal_count
+    agg.recent_count = recent_count
+    agg.totals = dict(zip(MACRO_KEYS, (t_cal, t_prot, t_carbs, t_fat, t_fiber)))
+    agg.recent = dict(zip(MACRO_KEYS, (r_cal, r_prot, r_carbs, r_fat, r_fiber)))
+    agg.daily = {
+        date_str: {
+            'count': count,
+            'calories': day_calories[date_str],
+            'protein': day_protein[date_str],
+            'carbs': day_carbs[date_str],
+            'fat': day_fat[date_str]
+        }
+        for date_str, count in day_count.items()
+    }
+    return agg
+
+
+def rank_foods(foods: Dict[str, FoodAcc], limit: int) -> List[Tuple[str, FoodAcc]]:
+    """Most frequently eaten foods, highest count first"""
+    # Partial top-k selection unless most of the labels are wanted anyway
+    if limit < len(foods) // 2:
+        return heapq.nlargest(limit, foods.items(), key=lambda x: x[1].count)
+    return sorted(foods.items(), key=lambda x: x[1].count, reverse=True)[:limit]
+
+
+class MealArrays(NamedTuple):
+    """Per-meal nutrition values as NumPy columns (structure of arrays)"""
+    calories: 'np.ndarray'
+    protein: 'np.ndarray'
+    carbs: 'np.ndarray'
+    fat: 'np.ndarray'
+    fiber: 'np.ndarray'
+    timestamps: 'np.ndarray'
+
+
+def to_arrays(meals: List[Dict[str, Any]]) -> Optional[MealArrays]:
+    """Extract nutrition columns once so reductions can run in NumPy"""
+    if np is None:
+        return None
+    
+    rows = []
+    stamps = []
+    try:
+        for meal in meals:
+            totals = (meal.get('analysisData') or {}).get('totals') or {}
+            macros = totals.get('macros') or {}
+            rows.append((
+                totals.get('calories_kcal', 0),
+                macros.get('protein_g', 0),
+                macros.get('carbs_g', 0),
+                macros.get('fat_g', 0),
+                macros.get('fiber_g', 0)
+            ))
+            # Naive local wall-clock time, the same value meal_ts() yields
+            stamp = meal.get('consumedAt', '')
+            if stamp[19:].rstrip('.0123456789'):
+                stamp = _to_local(parse_ts(stamp)).isoformat(timespec='seconds')
+            stamps.append(stamp[:19])
+        
+        columns = np.array(rows)
+        timestamps = np.array(stamps, dtype='datetime64[s]')
+    except (TypeError, ValueError):
+        # Odd timestamps; the pure-Python path reports or handles them
+        return None
+    
+    if columns.dtype.kind not in 'iuf' or np.isnat(timestamps).any():
+        # None or strings among the values, or a missing consumedAt; leave
+        # them to the pure-Python path instead of coercing to NaN/floats/NaT
+        return None
+    
+    return MealArrays(*columns.astype(np.float64).reshape(-1, 5).T, timestamps)
+
+
+def recent_index(arrays: MealArrays, cutoff: datetime) -> 'np.ndarray':
+    """Indices of the meals after cutoff, via a vectorized timestamp mask"""
+    return np.nonzero(arrays.timestamps > np.datetime64(cutoff, 's'))[0]
+
+
+def column_totals(arrays: MealArrays, idx: 'np.ndarray' = None) -> Dict[str, float]:
+    """Sum every nutrition column, optionally over the meals at idx only"""
+    columns = arrays[:len(MACRO_KEYS)]
+    if idx is not None:
+        columns = [col[idx] for col in columns]
+    return {key: float(col.sum()) for key, col in zip(MACRO_KEYS, columns)}
+
+
+def daily_buckets(arrays: MealArrays, idx: 'np.ndarray') -> Dict[str, Dict[str, float]]:
+    """Per-day meal counts and macro sums for the meals at idx"""
+    columns = [arrays.calories[idx], arrays.protein[idx], arrays.carbs[idx], arrays.fat[idx]]
+    days, day_idx = np.unique(
+        arrays.timestamps[idx].astype('datetime64[D]'), return_inverse=True
+    )
+    counts = np.bincount(day_idx, minlength=len(days))
+    calories, protein, carbs, fat = (
+        np.bincount(day_idx, weights=col, minlength=len(days)) for col in columns
+    )
+    return {
+        str(day): {
+            'count': int(counts[i]),
+            'calories': float(calories[i]),
+            'protein': float(protein[i]),
+            'carbs': float(carbs[i]),
+            'fat': float(fat[i])
+        }
+        for i, day in enumerate(days)
+    }
+
+
+class MealStore:
+    """meals property for the analyzer and the report
+    
+    Keeps the NumPy columns and the parsed-timestamp cache in step with the
+    list. Subclasses set data_file and stream before assigning meals.
+    """
+    
+    @property
+    def meals(self) -> List[Dict[str, Any]]:
+        """Loaded meals; reassign the list after editing individual meals in place"""
+        return self._meals
+    
+    @meals.setter
+    def meals(self, meals: List[Dict[str, Any]]):
+        # Drop the NumPy columns and parsed timestamps so every reduction sees the same meals
+        self._meals = meals
+        self._arrays_len = None
+        self._ts_cache = {}
+        self._meals_changed()
+    
+    def _meals_changed(self):
+        """Hook for subclasses holding results derived from the meals"""
+    
+    def _iter_meals(self) -> Iterator[Dict[str, Any]]:
+        """Yield meals one at a time, streaming from disk in stream mode"""
+        if not self.stream:
+            yield from self.meals
+            return
+        
+        yield from stream_meals(self.data_file)
+    
+    def _meal_arrays(self) -> Optional[MealArrays]:
+        """NumPy columns for the current meals, rebuilt when the list changed length"""
+        meals = self._meals
+        if self._arrays_len != len(meals):
+            # Catches appends and removals on the list itself, not just reassignment
+            self._arrays = to_arrays(meals) if meals else None
+            self._arrays_len = len(meals)
+        return self._arrays
+    
+    def _meal_ts_cache(self) -> Optional[Dict[int, Tuple[Dict[str, Any], datetime]]]:
+        """Timestamp cache for fuse_aggregate(); None when meals are streamed"""
+        return None if self.stream else self._ts_cache
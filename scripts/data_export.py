@@ -7,68 +7,111 @@ Convert nutrition data between different formats (JSON, CSV, Excel, etc.)
 import json
 import csv
 import sys
+from collections import Counter
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterator
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from _agg import load_meals, parse_ts, stream_meals
+
+
+def _dumps(obj: Any) -> bytes:
+    """Encode obj as indented UTF-8 JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(obj, indent=2, ensure_ascii=False).encode('utf-8')
+
+
+SUMMARY_CSV_COLUMNS = (
+    'Date', 'Time', 'Meal Type', 'Meal Name',
+    'Calories (kcal)', 'Protein (g)', 'Carbs (g)', 'Fat (g)',
+    'Fiber (g)', 'Sugar (g)', 'Sodium (mg)', 'Items Count'
+)
+SUMMARY_CSV_HEADER = ','.join(SUMMARY_CSV_COLUMNS) + '\r\n'
+
+# Large write buffer for CSV exports; rows are small and numerous
+WRITE_BUFFER_SIZE = 1 << 20
+
+
+def _csv_escape(value: Any) -> str:
+    """Quote a CSV field the way csv.writer's QUOTE_MINIMAL would"""
+    if value is None:
+        return ''
+    value = str(value)
+    if ',' in value or '"' in value or '\n' in value or '\r' in value:
+        return '"' + value.replace('"', '""') + '"'
+    return value
+
+
+def _extract(meal: Dict[str, Any]):
+    """Return a meal's (analysis, totals, macros, micros) sub-dicts in one go"""
+    analysis = meal.get('analysisData') or {}
+    totals = analysis.get('totals') or {}
+    return analysis, totals, totals.get('macros') or {}, totals.get('micros') or {}
 
 
 class NutritionDataExporter:
     """Export nutrition data to various formats"""
     
-    def __init__(self, input_file: str):
+    def __init__(self, input_file: str, stream: bool = False):
         self.input_file = input_file
+        self.stream = stream
         self.meals = []
         self.load_data()
     
     def load_data(self):
         """Load data from JSON file"""
-        try:
-            with open(self.input_file, 'r', encoding='utf-8') as f:
-                self.meals = json.load(f)
-            print(f"✓ Loaded {len(self.meals)} meals from {self.input_file}")
-        except Exception as e:
-            print(f"✗ Error loading data: {e}")
-            sys.exit(1)
+        meals = load_meals(self.input_file, self.stream)
+        self.stream = meals is None
+        if not self.stream:
+            self.meals = meals
+            print(f"✓ Loaded {len(meals)} meals from {self.input_file}")
+    
+    def iter_meals(self) -> Iterator[Dict[str, Any]]:
+        """Yield meals one at a time, streaming from disk in stream mode"""
+        if not self.stream:
+            yield from self.meals
+            return
+        
+        yield from stream_meals(self.input_file)
     
     def export_to_csv(self, output_file: str):
         """Export meals to CSV format"""
         try:
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
+            with open(output_file, 'w', newline='', encoding='utf-8',
+                      buffering=WRITE_BUFFER_SIZE) as f:
+                write = f.write
                 
                 # Write header
-                writer.writerow([
-                    'Date', 'Time', 'Meal Type', 'Meal Name',
-                    'Calories (kcal)', 'Protein (g)', 'Carbs (g)', 'Fat (g)',
-                    'Fiber (g)', 'Sugar (g)', 'Sodium (mg)', 'Items Count'
-                ])
+                write(SUMMARY_CSV_HEADER)
                 
-                # Write data
-                for meal in self.meals:
-                    consumed_at = datetime.fromisoformat(
-                        meal.get('consumedAt', '').replace('Z', '+00:00')
-                    )
+                # Write data; every field goes through _csv_escape, so a null
+                # becomes an empty field and commas are quoted as csv.writer did
+                for meal in self.iter_meals():
+                    consumed_at = parse_ts(meal['consumedAt'])
                     
-                    analysis = meal.get('analysisData', {})
-                    totals = analysis.get('totals', {})
-                    macros = totals.get('macros', {})
-                    micros = totals.get('micros', {})
-                    composition = analysis.get('composition', [])
+                    analysis, totals, macros, micros = _extract(meal)
+                    meal_type = _csv_escape(meal.get('mealType', ''))
+                    name = _csv_escape(meal.get('name', ''))
+                    calories = _csv_escape(totals.get('calories_kcal', 0))
+                    protein = _csv_escape(macros.get('protein_g', 0))
+                    carbs = _csv_escape(macros.get('carbs_g', 0))
+                    fat = _csv_escape(macros.get('fat_g', 0))
+                    fiber = _csv_escape(macros.get('fiber_g', 0))
+                    sugar = _csv_escape(macros.get('sugar_g', 0))
+                    sodium = _csv_escape(micros.get('sodium_mg', 0))
+                    n_items = len(analysis.get('composition') or ())
                     
-                    writer.writerow([
-                        consumed_at.strftime('%Y-%m-%d'),
-                        consumed_at.strftime('%H:%M:%S'),
-                        meal.get('mealType', ''),
-                        meal.get('name', ''),
-                        totals.get('calories_kcal', 0),
-                        macros.get('protein_g', 0),
-                        macros.get('carbs_g', 0),
-                        macros.get('fat_g', 0),
-                        macros.get('fiber_g', 0),
-                        macros.get('sugar_g', 0),
-                        micros.get('sodium_mg', 0),
-                        len(composition)
-                    ])
+                    write(
+                        f"{consumed_at:%Y-%m-%d},{consumed_at:%H:%M:%S},"
+                        f"{meal_type},{name},{calories},{protein},{carbs},{fat},"
+                        f"{fiber},{sugar},{sodium},{n_items}\r\n"
+                    )
             
             print(f"✓ Exported to CSV: {output_file}")
         except Exception as e:
@@ -77,8 +120,10 @@ class NutritionDataExporter:
     def export_detailed_csv(self, output_file: str):
         """Export detailed meal composition to CSV"""
         try:
-            with open(output_file, 'w', newline='', encoding='utf-8') as f:
-                writer = csv.writer(f)
+            with open(output_file, 'w', newline='', encoding='utf-8',
+                      buffering=WRITE_BUFFER_SIZE) as f:
+                # Labels and allergen lists can contain commas
+                writer = csv.writer(f, quoting=csv.QUOTE_MINIMAL)
                 
                 # Write header
                 writer.writerow([
@@ -88,130 +133,110 @@ class NutritionDataExporter:
                 ])
                 
                 # Write data
-                for meal in self.meals:
-                    consumed_at = datetime.fromisoformat(
-                        meal.get('consumedAt', '').replace('Z', '+00:00')
-                    )
-                    date_str = consumed_at.strftime('%Y-%m-%d')
-                    meal_type = meal.get('mealType', '')
-                    
-                    analysis = meal.get('analysisData', {})
-                    composition = analysis.get('composition', [])
-                    
-                    for item in composition:
-                        nutrition = item.get('nutrition', {})
-                        macros = nutrition.get('macros', {})
-                        micros = nutrition.get('micros', {})
-                        allergens = ', '.join(nutrition.get('allergens', []))
-                        
-                        writer.writerow([
-                            date_str,
-                            meal_type,
-                            item.get('label', ''),
-                            f"{item.get('confidence', 0) * 100:.1f}%",
-                            item.get('serving_est_g', 0),
-                            nutrition.get('calories_kcal', 0),
-                            macros.get('protein_g', 0),
-                            macros.get('carbs_g', 0),
-                            macros.get('fat_g', 0),
-                            macros.get('fiber_g', 0),
-                            macros.get('sugar_g', 0),
-                            micros.get('sodium_mg', 0),
-                            allergens
-                        ])
+                writer.writerows(self._detailed_rows())
             
             print(f"✓ Exported detailed CSV: {output_file}")
         except Exception as e:
             print(f"✗ Error exporting detailed CSV: {e}")
     
+    def _detailed_rows(self):
+        """Yield one detailed CSV row per composition item"""
+        for meal in self.iter_meals():
+            date_str = parse_ts(meal['consumedAt']).strftime('%Y-%m-%d')
+            meal_type = meal.get('mealType', '')
+            
+            analysis = meal.get('analysisData') or {}
+            
+            for item in analysis.get('composition') or ():
+                nutrition = item.get('nutrition') or {}
+                macros = nutrition.get('macros') or {}
+                micros = nutrition.get('micros') or {}
+                
+                yield (
+                    date_str,
+                    meal_type,
+                    item.get('label', ''),
+                    f"{item.get('confidence', 0) * 100:.1f}%",
+                    item.get('serving_est_g', 0),
+                    nutrition.get('calories_kcal', 0),
+                    macros.get('protein_g', 0),
+                    macros.get('carbs_g', 0),
+                    macros.get('fat_g', 0),
+                    macros.get('fiber_g', 0),
+                    macros.get('sugar_g', 0),
+                    micros.get('sodium_mg', 0),
+                    ', '.join(nutrition.get('allergens', []))
+                )
+    
     def export_summary_json(self, output_file: str):
         """Export summary statistics to JSON"""
         try:
+            stats = self._aggregate()
             summary = {
                 'generated_at': datetime.now().isoformat(),
-                'total_meals': len(self.meals),
-                'date_range': self._get_date_range(),
-                'meal_types': self._count_meal_types(),
-                'nutrition_totals': self._calculate_totals(),
-                'daily_averages': self._calculate_daily_averages()
+                'total_meals': stats['total_meals'],
+                'date_range': stats['date_range'],
+                'meal_types': stats['meal_types'],
+                'nutrition_totals': stats['totals'],
+                'daily_averages': stats['daily_averages']
             }
             
-            with open(output_file, 'w', encoding='utf-8') as f:
-                json.dump(summary, f, indent=2, ensure_ascii=False)
+            with open(output_file, 'wb') as f:
+                f.write(_dumps(summary))
             
             print(f"✓ Exported summary JSON: {output_file}")
         except Exception as e:
             print(f"✗ Error exporting summary JSON: {e}")
     
-    def _get_date_range(self) -> Dict[str, str]:
-        """Get date range of meals"""
-        if not self.meals:
-            return {'start': None, 'end': None}
+    def _aggregate(self) -> Dict[str, Any]:
+        """Compute date range, meal type counts, totals and daily averages in one pass"""
+        calories = protein = carbs = fat = fiber = sugar = 0
+        meal_types = Counter()
+        dates = set()
+        count = 0
         
-        dates = [
-            datetime.fromisoformat(meal.get('consumedAt', '').replace('Z', '+00:00'))
-            for meal in self.meals
-        ]
+        for meal in self.iter_meals():
+            count += 1
+            # ISO timestamps start with YYYY-MM-DD; no need to build a datetime
+            dates.add(meal['consumedAt'][:10])
+            
+            meal_types[meal.get('mealType', 'unknown')] += 1
+            
+            _, meal_totals, macros, _ = _extract(meal)
+            
+            calories += meal_totals.get('calories_kcal', 0)
+            protein += macros.get('protein_g', 0)
+            carbs += macros.get('carbs_g', 0)
+            fat += macros.get('fat_g', 0)
+            fiber += macros.get('fiber_g', 0)
+            sugar += macros.get('sugar_g', 0)
         
-        return {
-            'start': min(dates).strftime('%Y-%m-%d'),
-            'end': max(dates).strftime('%Y-%m-%d')
-        }
-    
-    def _count_meal_types(self) -> Dict[str, int]:
-        """Count meals by type"""
-        counts = {}
-        for meal in self.meals:
-            meal_type = meal.get('mealType', 'unknown')
-            counts[meal_type] = counts.get(meal_type, 0) + 1
-        return counts
-    
-    def _calculate_totals(self) -> Dict[str, float]:
-        """Calculate total nutrition"""
         totals = {
-            'calories': 0,
-            'protein': 0,
-            'carbs': 0,
-            'fat': 0,
-            'fiber': 0,
-            'sugar': 0
+            'calories': round(calories, 2),
+            'protein': round(protein, 2),
+            'carbs': round(carbs, 2),
+            'fat': round(fat, 2),
+            'fiber': round(fiber, 2),
+            'sugar': round(sugar, 2)
         }
         
-        for meal in self.meals:
-            analysis = meal.get('analysisData', {})
-            meal_totals = analysis.get('totals', {})
-            macros = meal_totals.get('macros', {})
-            
-            totals['calories'] += meal_totals.get('calories_kcal', 0)
-            totals['protein'] += macros.get('protein_g', 0)
-            totals['carbs'] += macros.get('carbs_g', 0)
-            totals['fat'] += macros.get('fat_g', 0)
-            totals['fiber'] += macros.get('fiber_g', 0)
-            totals['sugar'] += macros.get('sugar_g', 0)
-        
-        return {k: round(v, 2) for k, v in totals.items()}
-    
-    def _calculate_daily_averages(self) -> Dict[str, float]:
-        """Calculate daily averages"""
-        if not self.meals:
-            return {}
-        
-        dates = set()
-        for meal in self.meals:
-            consumed_at = datetime.fromisoformat(
-                meal.get('consumedAt', '').replace('Z', '+00:00')
-            )
-            dates.add(consumed_at.date())
+        if dates:
+            date_range = {'start': min(dates), 'end': max(dates)}
+        else:
+            date_range = {'start': None, 'end': None}
         
         total_days = len(dates)
-        if total_days == 0:
-            return {}
-        
-        totals = self._calculate_totals()
-        
-        return {
+        daily_averages = {
             k: round(v / total_days, 2)
             for k, v in totals.items()
+        } if total_days else {}
+        
+        return {
+            'total_meals': count,
+            'date_range': date_range,
+            'meal_types': dict(meal_types),
+            'totals': totals,
+            'daily_averages': daily_averages
         }
 
 
@@ -224,6 +249,7 @@ def main():
         print("  --detailed-csv <file>  Export detailed composition to CSV")
         print("  --summary-json <file>  Export summary statistics to JSON")
         print("  --all <prefix>         Export all formats with given prefix")
+        print("  --stream               Stream meals from disk (requires ijson)")
         print("\nExample:")
         print("  python data_export.py meals.json --csv summary.csv")
         print("  python data_export.py meals.json --all exported_data")
@@ -235,12 +261,14 @@ def main():
         print(f"✗ File not found: {input_file}")
         sys.exit(1)
     
-    exporter = NutritionDataExporter(input_file)
+    exporter = NutritionDataExporter(input_file, stream='--stream' in sys.argv[2:])
     
     # Parse arguments
     i = 2
     while i < len(sys.argv):
-        if sys.argv[i] == '--csv' and i + 1 < len(sys.argv):
+        if sys.argv[i] == '--stream':
+            i += 1
+        elif sys.argv[i] == '--csv' and i + 1 < len(sys.argv):
             exporter.export_to_csv(sys.argv[i + 1])
             i += 2
         elif sys.argv[i] == '--detailed-csv' and i + 1 < len(sys.argv):
@@ -7,6 +7,8 @@ Includes resizing, format conversion, and quality optimization
 
 import sys
 import base64
+import shutil
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
 from typing import Tuple, Optional
 
@@ -18,37 +20,77 @@ except ImportError:
     print("Install with: pip install Pillow")
     sys.exit(1)
 
+try:
+    import numpy as np
+    from turbojpeg import TurboJPEG, TJPF_RGB, TJSAMP_420
+except ImportError:
+    TurboJPEG = None
+
+# Supported image formats (matched case-insensitively)
+IMAGE_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif'})
+
+# Embedded metadata (GPS position, camera details, color profiles) that
+# re-encoding drops; a JPEG carrying any of it is never passed through as is
+METADATA_KEYS = ('exif', 'icc_profile', 'xmp')
+
 
 class ImagePreprocessor:
     """Preprocess images for food nutrition analysis"""
     
     def __init__(self, max_size: Tuple[int, int] = (1920, 1920), 
-                 quality: int = 85, format: str = 'JPEG'):
+                 quality: int = 85, format: str = 'JPEG', verbose: bool = True,
+                 exit_on_error: bool = True):
         self.max_size = max_size
         self.quality = quality
         self.format = format
+        self.verbose = verbose
+        # CLI use exits on unreadable input; batch workers raise to the caller
+        self.exit_on_error = exit_on_error
+        self._tj = self._init_turbojpeg()
+    
+    def _log(self, message: str):
+        """Print a progress message when running verbosely"""
+        if self.verbose:
+            print(message)
+    
+    def _init_turbojpeg(self):
+        """Create a libjpeg-turbo encoder if PyTurboJPEG is usable"""
+        if TurboJPEG is None or self.format != 'JPEG':
+            return None
+        try:
+            return TurboJPEG()
+        except (OSError, RuntimeError):
+            # Python bindings installed but the shared library is missing
+            return None
     
     def load_image(self, image_path: str) -> Image.Image:
         """Load image from file"""
         try:
             img = Image.open(image_path)
-            print(f"✓ Loaded image: {image_path}")
-            print(f"  Original size: {img.size[0]}x{img.size[1]}")
-            print(f"  Original format: {img.format}")
-            print(f"  Original mode: {img.mode}")
+            self._log(f"✓ Loaded image: {image_path}")
+            self._log(f"  Original size: {img.size[0]}x{img.size[1]}")
+            self._log(f"  Original format: {img.format}")
+            self._log(f"  Original mode: {img.mode}")
             return img
         except Exception as e:
+            if not self.exit_on_error:
+                raise
             print(f"✗ Error loading image: {e}")
             sys.exit(1)
     
     def resize_image(self, img: Image.Image) -> Image.Image:
         """Resize image while maintaining aspect ratio"""
         if img.size[0] <= self.max_size[0] and img.size[1] <= self.max_size[1]:
-            print("  No resizing needed")
+            self._log("  No resizing needed")
             return img
         
+        if img.format == 'JPEG':
+            # Let libjpeg decode at a reduced DCT scale (1/2, 1/4, 1/8)
+            # that still covers max_size; thumbnail() does the exact resize.
+            # Done here, not at load, so is_compliant() sees the real size
+            img.draft('RGB', self.max_size)
         img.thumbnail(self.max_size, Image.Resampling.LANCZOS)
-        print(f"  Resized to: {img.size[0]}x{img.size[1]}")
+        self._log(f"  Resized to: {img.size[0]}x{img.size[1]}")
         return img
     
     def convert_mode(self, img: Image.Image) -> Image.Image:
@@ -56,59 +98,128 @@ class ImagePreprocessor:
         if img.mode == 'RGBA' and self.format == 'JPEG':
             # Create white background
             background = Image.new('RGB', img.size, (255, 255, 255))
-            background.paste(img, mask=img.split()[3] if len(img.split()) > 3 else None)
-            print("  Converted RGBA to RGB (white background)")
+            background.paste(img, mask=img.getchannel('A'))
+            self._log("  Converted RGBA to RGB (white background)")
             return background
         elif img.mode != 'RGB' and self.format == 'JPEG':
             img = img.convert('RGB')
-            print(f"  Converted mode to RGB")
+            self._log(f"  Converted mode to RGB")
             return img
         return img
     
-    def optimize_image(self, img: Image.Image) -> bytes:
-        """Optimize image and return bytes"""
-        buffer = io.BytesIO()
-        img.save(buffer, format=self.format, quality=self.quality, optimize=True)
-        img_bytes = buffer.getvalue()
-        print(f"  Optimized size: {len(img_bytes) / 1024:.2f} KB")
+    def optimize_to_bytes(self, img: Image.Image) -> bytes:
+        """Optimize image and return the encoded bytes"""
+        if self._tj is not None:
+            img_bytes = self._encode_turbojpeg(img)
+        else:
+            buffer = io.BytesIO()
+            img.save(buffer, format=self.format, quality=self.quality, optimize=True)
+            # CPython returns the BytesIO's internal bytes object here
+            # (trimmed in place) rather than a second full-image copy
+            img_bytes = buffer.getvalue()
+        self._log(f"  Optimized size: {len(img_bytes) / 1024:.2f} KB")
         return img_bytes
     
+    def optimize_to_file(self, img: Image.Image, output_path: str):
+        """Optimize image and write it straight to output_path"""
+        if self._tj is not None:
+            img_bytes = self._encode_turbojpeg(img)
+            with open(output_path, 'wb') as f:
+                f.write(img_bytes)
+        else:
+            img.save(output_path, format=self.format, quality=self.quality, optimize=True)
+        if self.verbose:
+            print(f"  Optimized size: {Path(output_path).stat().st_size / 1024:.2f} KB")
+    
+    def _encode_turbojpeg(self, img: Image.Image) -> bytes:
+        """Encode image with libjpeg-turbo"""
+        # convert_mode() has normally produced RGB already; avoid another full copy
+        if img.mode != 'RGB':
+            img = img.convert('RGB')
+        return self._tj.encode(
+            np.asarray(img),
+            quality=self.quality,
+            pixel_format=TJPF_RGB,
+            jpeg_subsample=TJSAMP_420
+        )
+    
     def to_base64(self, img_bytes: bytes) -> str:
         """Convert image bytes to base64 string"""
         b64_string = base64.b64encode(img_bytes).decode('utf-8')
         return f"data:image/jpeg;base64,{b64_string}"
     
-    def process(self, image_path: str) -> Tuple[bytes, str]:
-        """Process image: resize, optimize, and convert to base64"""
-        print("\nProcessing image...")
-        
-        # Load image
-        img = self.load_image(image_path)
-        
+    def is_compliant(self, img: Image.Image) -> bool:
+        """Check whether a loaded image already needs no resize, conversion or re-encode"""
+        return (
+            self.format == 'JPEG'
+            and img.format == 'JPEG'
+            and img.mode == 'RGB'
+            and img.size[0] <= self.max_size[0]
+            and img.size[1] <= self.max_size[1]
+            and not any(key in img.info for key in METADATA_KEYS)
+        )
+    
+    def _prepare(self, img: Image.Image) -> Image.Image:
+        """Resize and convert a loaded image ready for encoding"""
         # Resize
         img = self.resize_image(img)
         
         # Convert mode
-        img = self.convert_mode(img)
+        return self.convert_mode(img)
+    
+    def process(self, image_path: str) -> Tuple[bytes, str]:
+        """Process image: resize, optimize, and convert to base64"""
+        self._log("\nProcessing image...")
+        
+        # Load image (header only until pixels are needed)
+        img = self.load_image(image_path)
         
-        # Optimize
-        img_bytes = self.optimize_image(img)
+        if self.is_compliant(img):
+            # Re-encoding would only cost CPU and quality
+            self._log("  Already within limits and metadata-free, keeping original JPEG")
+            img_bytes = Path(image_path).read_bytes()
+        else:
+            img = self._prepare(img)
+            
+            # Optimize
+            img_bytes = self.optimize_to_bytes(img)
         
         # Convert to base64
         b64_string = self.to_base64(img_bytes)
         
-        print(f"✓ Processing complete")
-        print(f"  Final size: {len(img_bytes) / 1024:.2f} KB")
-        print(f"  Base64 length: {len(b64_string)} characters")
+        self._log(f"✓ Processing complete")
+        self._log(f"  Final size: {len(img_bytes) / 1024:.2f} KB")
+        self._log(f"  Base64 length: {len(b64_string)} characters")
         
         return img_bytes, b64_string
     
+    def process_to_file(self, image_path: str, output_path: str):
+        """Process image and save it to output_path without an in-memory copy"""
+        self._log("\nProcessing image...")
+        
+        img = self.load_image(image_path)
+        
+        try:
+            if self.is_compliant(img):
+                self._log("  Already within limits and metadata-free, keeping original JPEG")
+                shutil.copyfile(image_path, output_path)
+            else:
+                self.optimize_to_file(self._prepare(img), output_path)
+            self._log(f"✓ Saved processed image to: {output_path}")
+        except shutil.SameFileError:
+            self._log(f"✓ Image already optimized: {output_path}")
+        except Exception as e:
+            # Pixels are decoded lazily, so this also covers corrupt input
+            if not self.exit_on_error:
+                raise
+            print(f"✗ Error processing image: {e}")
+    
     def save_processed(self, img_bytes: bytes, output_path: str):
         """Save processed image to file"""
         try:
             with open(output_path, 'wb') as f:
                 f.write(img_bytes)
-            print(f"✓ Saved processed image to: {output_path}")
+            self._log(f"✓ Saved processed image to: {output_path}")
         except Exception as e:
             print(f"✗ Error saving image: {e}")
     
@@ -117,12 +228,29 @@ class ImagePreprocessor:
         try:
             with open(output_path, 'w') as f:
                 f.write(b64_string)
-            print(f"✓ Saved base64 to: {output_path}")
+            self._log(f"✓ Saved base64 to: {output_path}")
         except Exception as e:
             print(f"✗ Error saving base64: {e}")
 
 
-def batch_process(input_dir: str, output_dir: str, max_size: Tuple[int, int] = (1920, 1920)):
+# Per-process preprocessor for batch workers, set up once by _init_worker
+_worker_preprocessor: Optional[ImagePreprocessor] = None
+
+
+def _init_worker(max_size: Tuple[int, int], quality: int):
+    """Create the worker's preprocessor (and its JPEG encoder) once"""
+    global _worker_preprocessor
+    _worker_preprocessor = ImagePreprocessor(max_size=max_size, quality=quality,
+                                             verbose=False, exit_on_error=False)
+
+
+def _process_file(image_file: str, output_file: str):
+    """Process one image in a worker process"""
+    _worker_preprocessor.process_to_file(image_file, output_file)
+
+
+def batch_process(input_dir: str, output_dir: str, max_size: Tuple[int, int] = (1920, 1920),
+                  quality: int = 85):
     """Batch process all images in a directory"""
     input_path = Path(input_dir)
     output_path = Path(output_dir)
@@ -133,13 +261,11 @@ def batch_process(input_dir: str, output_dir: str, max_size: Tuple[int, int] = (
     
     output_path.mkdir(parents=True, exist_ok=True)
     
-    # Supported image formats
-    extensions = ['.jpg', '.jpeg', '.png', '.webp', '.bmp', '.gif']
-    image_files = []
-    
-    for ext in extensions:
-        image_files.extend(input_path.glob(f"*{ext}"))
-        image_files.extend(input_path.glob(f"*{ext.upper()}"))
+    # One directory scan instead of two globs per extension
+    image_files = sorted(
+        p for p in input_path.iterdir()
+        if p.suffix.lower() in IMAGE_EXTENSIONS and p.is_file()
+    )
     
     if not image_files:
         print(f"No image files found in {input_dir}")
@@ -148,23 +274,41 @@ def batch_process(input_dir: str, output_dir: str, max_size: Tuple[int, int] = (
     print(f"\nFound {len(image_files)} images to process")
     print("=" * 60)
     
-    preprocessor = ImagePreprocessor(max_size=max_size)
+    # Give every image its own output file, so no two workers write the same path
+    # (compared case-insensitively, as on macOS/Windows filesystems)
+    output_names = {}
+    taken = set()
+    for img_file in image_files:
+        name = f"{img_file.stem}_processed.jpg"
+        if name.lower() in taken:
+            name = f"{img_file.stem}_{img_file.suffix[1:].lower()}_processed.jpg"
+            print(f"Note: {img_file.name} shares its name with another image, saving as {name}")
+        taken.add(name.lower())
+        output_names[img_file] = name
     
-    for i, img_file in enumerate(image_files, 1):
-        print(f"\n[{i}/{len(image_files)}] Processing: {img_file.name}")
-        
-        output_file = output_path / f"{img_file.stem}_processed.jpg"
+    processed = 0
+    # Each image is independent and CPU-bound, so fan out across processes
+    with ProcessPoolExecutor(initializer=_init_worker,
+                             initargs=(max_size, quality)) as executor:
+        futures = {
+            executor.submit(
+                _process_file, str(img_file), str(output_path / output_names[img_file])
+            ): img_file
+            for img_file in image_files
+        }
         
-        try:
-            img_bytes, _ = preprocessor.process(str(img_file))
-            preprocessor.save_processed(img_bytes, str(output_file))
-        except Exception as e:
-            print(f"✗ Error processing {img_file.name}: {e}")
-            continue
+        for i, future in enumerate(as_completed(futures), 1):
+            img_file = futures[future]
+            try:
+                future.result()
+                processed += 1
+                print(f"[{i}/{len(image_files)}] Processed: {img_file.name}")
+            except Exception as e:
+                print(f"✗ Error processing {img_file.name}: {e}")
     
     print("\n" + "=" * 60)
     print(f"✓ Batch processing complete!")
-    print(f"  Processed: {len(image_files)} images")
+    print(f"  Processed: {processed}/{len(image_files)} images")
     print(f"  Output directory: {output_dir}")
 
 
@@ -254,8 +398,7 @@ def main():
         input_file = filtered_args[0]
         output_file = filtered_args[1] if len(filtered_args) > 1 else f"{Path(input_file).stem}_processed.jpg"
         
-        img_bytes, _ = preprocessor.process(input_file)
-        preprocessor.save_processed(img_bytes, output_file)
+        preprocessor.process_to_file(input_file, output_file)
     
     elif command == 'base64':
         if len(filtered_args) < 1:
@@ -276,7 +419,7 @@ def main():
         input_dir = filtered_args[0]
         output_dir = filtered_args[1]
         
-        batch_process(input_dir, output_dir, max_size)
+        batch_process(input_dir, output_dir, max_size, quality)
     
     else:
         print(f"Unknown command: {command}")
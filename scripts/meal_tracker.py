@@ -10,32 +10,84 @@ from datetime import datetime, timedelta
 from pathlib import Path
 from typing import List, Dict, Any
 
+# Pre-NDJSON data file, read until the first write creates the NDJSON log
+LEGACY_DATA_FILE = "meals_data.json"
+
+VALID_MEAL_TYPES = frozenset({'breakfast', 'lunch', 'dinner', 'snack'})
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from _agg import loads, meal_ts
+
+
+def _dumps_line(obj: Any) -> bytes:
+    """Encode obj as a single NDJSON line, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_NON_STR_KEYS) + b'\n'
+    return json.dumps(obj, ensure_ascii=False).encode('utf-8') + b'\n'
+
+
+def _extract(meal: Dict[str, Any]):
+    """Return a meal's (totals, macros) sub-dicts in one go"""
+    totals = (meal.get('analysisData') or {}).get('totals') or {}
+    return totals, totals.get('macros') or {}
+
 
 class MealTrackerCLI:
     """CLI for meal tracking"""
     
-    def __init__(self, data_file: str = "meals_data.json"):
+    def __init__(self, data_file: str = "meals.ndjson"):
         self.data_file = data_file
         self.meals = []
         self.load_data()
     
     def load_data(self):
-        """Load meals from file"""
+        """Load meals from the NDJSON log (one meal per line, oldest first)"""
         if Path(self.data_file).exists():
             try:
-                with open(self.data_file, 'r', encoding='utf-8') as f:
-                    self.meals = json.load(f)
+                with open(self.data_file, 'rb') as f:
+                    self.meals = [loads(line) for line in f if line.strip()]
+                # Keep the most recent meal first in memory
+                self.meals.reverse()
             except Exception as e:
                 print(f"Warning: Could not load data: {e}")
                 self.meals = []
+        elif Path(LEGACY_DATA_FILE).exists():
+            self._load_legacy()
         else:
             self.meals = []
     
+    def _load_legacy(self):
+        """Read the old JSON array file; the first write copies it into the NDJSON log"""
+        try:
+            with open(LEGACY_DATA_FILE, 'rb') as f:
+                self.meals = loads(f.read())
+        except Exception as e:
+            print(f"Warning: Could not load data: {e}")
+            self.meals = []
+    
     def save_data(self):
-        """Save meals to file"""
+        """Rewrite the whole NDJSON log from memory"""
         try:
-            with open(self.data_file, 'w', encoding='utf-8') as f:
-                json.dump(self.meals, f, indent=2, ensure_ascii=False)
+            with open(self.data_file, 'wb') as f:
+                f.writelines(_dumps_line(meal) for meal in reversed(self.meals))
+            print(f"✓ Data saved to {self.data_file}")
+        except Exception as e:
+            print(f"✗ Error saving data: {e}")
+    
+    def append_meal(self, meal: Dict[str, Any]):
+        """Append a single meal to the NDJSON log"""
+        if not Path(self.data_file).exists():
+            # No log yet: write out every meal, including any read from the legacy file
+            self.save_data()
+            return
+        
+        try:
+            with open(self.data_file, 'ab') as f:
+                f.write(_dumps_line(meal))
             print(f"✓ Data saved to {self.data_file}")
         except Exception as e:
             print(f"✗ Error saving data: {e}")
@@ -81,16 +133,19 @@ class MealTrackerCLI:
         }
         
         self.meals.insert(0, meal)
-        self.save_data()
+        self.append_meal(meal)
         print(f"✓ Added {meal_type} meal: {calories} kcal, {protein}g protein, {carbs}g carbs, {fat}g fat")
     
     def list_meals(self, days: int = 7):
         """List recent meals"""
+        # Browser exports carry UTC ('Z') stamps, so compare in local time
+        # like the analyzer and report do, parsing each meal once
         cutoff = datetime.now() - timedelta(days=days)
-        recent_meals = [
-            meal for meal in self.meals
-            if datetime.fromisoformat(meal.get('consumedAt', '').replace('Z', '+00:00')) > cutoff
-        ]
+        recent_meals = []
+        for meal in self.meals:
+            consumed_at = meal_ts(meal)
+            if consumed_at > cutoff:
+                recent_meals.append((meal, consumed_at))
         
         if not recent_meals:
             print(f"No meals found in the last {days} days")
@@ -100,13 +155,8 @@ class MealTrackerCLI:
         print(f"MEALS - Last {days} Days ({len(recent_meals)} meals)")
         print(f"{'='*80}\n")
         
-        for meal in recent_meals:
-            consumed_at = datetime.fromisoformat(
-                meal.get('consumedAt', '').replace('Z', '+00:00')
-            )
-            analysis = meal.get('analysisData', {})
-            totals = analysis.get('totals', {})
-            macros = totals.get('macros', {})
+        for meal, consumed_at in recent_meals:
+            totals, macros = _extract(meal)
             
             print(f"📅 {consumed_at.strftime('%Y-%m-%d %H:%M')}")
             print(f"   Type: {meal.get('mealType', 'unknown').upper()}")
@@ -123,12 +173,10 @@ class MealTrackerCLI:
         if date is None:
             date = datetime.now()
         
-        day_start = date.replace(hour=0, minute=0, second=0, microsecond=0)
-        day_end = day_start + timedelta(days=1)
-        
+        day = date.date()
         day_meals = [
             meal for meal in self.meals
-            if day_start <= datetime.fromisoformat(meal.get('consumedAt', '').replace('Z', '+00:00')) < day_end
+            if meal_ts(meal).date() == day
         ]
         
         total_calories = 0
@@ -137,9 +185,7 @@ class MealTrackerCLI:
         total_fat = 0
         
         for meal in day_meals:
-            analysis = meal.get('analysisData', {})
-            totals = analysis.get('totals', {})
-            macros = totals.get('macros', {})
+            totals, macros = _extract(meal)
             
             total_calories += totals.get('calories_kcal', 0)
             total_protein += macros.get('protein_g', 0)
@@ -171,7 +217,7 @@ class MealTrackerCLI:
         print("\n--- Add New Meal ---")
         
         meal_type = input("Meal type (breakfast/lunch/dinner/snack): ").strip().lower()
-        if meal_type not in ['breakfast', 'lunch', 'dinner', 'snack']:
+        if meal_type not in VALID_MEAL_TYPES:
             meal_type = 'snack'
         
         try:
@@ -4,147 +4,170 @@ Nutrition Analyzer Script
 Analyze nutrition data from JSON files and generate insights
 """
 
-import json
 import sys
+from collections import Counter
 from datetime import datetime, timedelta
-from typing import Dict, List, Any
+from functools import cached_property
+from typing import Dict, List, Any, Optional
 from pathlib import Path
 
+from _agg import (
+    Aggregates, MealArrays, MealStore, column_totals, fuse_aggregate,
+    load_meals, rank_foods, recent_index
+)
 
-class NutritionAnalyzer:
+
+class NutritionAnalyzer(MealStore):
     """Analyze nutrition data and provide insights"""
     
-    def __init__(self, data_file: str = None):
+    # cached_property results, dropped whenever new data is loaded
+    _CACHED = ('macros_summary', 'meal_frequency', 'top_foods_10')
+    
+    def __init__(self, data_file: str = None, stream: bool = False):
         self.data_file = data_file
+        self.stream = stream
         self.meals = []
         if data_file and Path(data_file).exists():
             self.load_data(data_file)
     
+    def _clear_cached(self):
+        """Drop cached_property results computed from earlier data"""
+        for name in self._CACHED:
+            self.__dict__.pop(name, None)
+    
+    # MealStore calls this whenever meals is reassigned
+    _meals_changed = _clear_cached
+    
     def load_data(self, filepath: str):
         """Load nutrition data from JSON file"""
-        try:
-            with open(filepath, 'r', encoding='utf-8') as f:
-                self.meals = json.load(f)
-            print(f"✓ Loaded {len(self.meals)} meals from {filepath}")
-        except Exception as e:
-            print(f"✗ Error loading data: {e}")
-            sys.exit(1)
+        self.data_file = filepath
+        self._clear_cached()
+        meals = load_meals(filepath, self.stream)
+        self.stream = meals is None
+        if not self.stream:
+            self.meals = meals
+            print(f"✓ Loaded {len(meals)} meals from {filepath}")
+    
+    @staticmethod
+    def _cutoff(days: Optional[int]) -> Optional[datetime]:
+        """Start of the recent window, or None when no window is wanted"""
+        return None if days is None else datetime.now() - timedelta(days=days)
+    
+    def _aggregate_all(self, days: Optional[int] = None) -> Aggregates:
+        """Run every reduction in one pass; consumedAt is only parsed when days is given"""
+        cutoff_date = self._cutoff(days)
+        arrays = self._meal_arrays()
+        agg = fuse_aggregate(
+            self._iter_meals(), recent_after=cutoff_date, with_totals=arrays is None,
+            ts_cache=self._meal_ts_cache()
+        )
+        if arrays is not None:
+            self._reduce_arrays(agg, arrays, cutoff_date)
+        
+        return agg
+    
+    @staticmethod
+    def _reduce_arrays(agg: Aggregates, arrays: MealArrays, cutoff_date: Optional[datetime]):
+        """Fill the calorie and macro totals with vectorized NumPy sums"""
+        agg.totals = column_totals(arrays)
+        
+        if cutoff_date is not None:
+            recent = recent_index(arrays, cutoff_date)
+            agg.recent_count = len(recent)
+            agg.recent = column_totals(arrays, recent)
+    
+    def _aggregate_macros(self, days: Optional[int] = None) -> Aggregates:
+        """Calorie and macro totals only, vectorized when NumPy columns exist"""
+        arrays = self._meal_arrays()
+        if arrays is None:
+            return self._aggregate_all(days)
+        
+        agg = Aggregates()
+        self._reduce_arrays(agg, arrays, self._cutoff(days))
+        return agg
     
     def analyze_macros(self) -> Dict[str, Any]:
         """Analyze macronutrient distribution"""
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        total_calories = 0
-        
-        for meal in self.meals:
-            analysis = meal.get('analysisData', {})
-            totals = analysis.get('totals', {})
-            macros = totals.get('macros', {})
-            
-            total_protein += macros.get('protein_g', 0)
-            total_carbs += macros.get('carbs_g', 0)
-            total_fat += macros.get('fat_g', 0)
-            total_calories += totals.get('calories_kcal', 0)
+        return self._format_macros(self._aggregate_macros())
+    
+    def get_meal_frequency(self) -> Dict[str, int]:
+        """Get frequency of meal types"""
+        return dict(Counter(meal.get('mealType', 'unknown') for meal in self._iter_meals()))
+    
+    def get_daily_averages(self, days: int = 7) -> Dict[str, float]:
+        """Calculate daily averages for the last N days"""
+        return self._format_daily_averages(self._aggregate_macros(days), days)
+    
+    def get_top_foods(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """Get most frequently detected food items"""
+        return self._format_top_foods(self._aggregate_all(), limit)
+    
+    @cached_property
+    def macros_summary(self) -> Dict[str, Any]:
+        """analyze_macros(), computed once per load"""
+        return self.analyze_macros()
+    
+    @cached_property
+    def meal_frequency(self) -> Dict[str, int]:
+        """get_meal_frequency(), computed once per load"""
+        return self.get_meal_frequency()
+    
+    @cached_property
+    def top_foods_10(self) -> List[Dict[str, Any]]:
+        """get_top_foods(10), computed once per load"""
+        return self.get_top_foods(10)
+    
+    @staticmethod
+    def _format_macros(agg: Aggregates) -> Dict[str, Any]:
+        """Build the macronutrient distribution from aggregated totals"""
+        totals = agg.totals
+        protein, carbs, fat = totals['protein'], totals['carbs'], totals['fat']
         
         # Calculate percentages
-        total_grams = total_protein + total_carbs + total_fat
+        total_grams = protein + carbs + fat
         
         if total_grams > 0:
-            protein_pct = (total_protein / total_grams) * 100
-            carbs_pct = (total_carbs / total_grams) * 100
-            fat_pct = (total_fat / total_grams) * 100
+            protein_pct = (protein / total_grams) * 100
+            carbs_pct = (carbs / total_grams) * 100
+            fat_pct = (fat / total_grams) * 100
         else:
             protein_pct = carbs_pct = fat_pct = 0
         
         return {
-            'total_protein': round(total_protein, 2),
-            'total_carbs': round(total_carbs, 2),
-            'total_fat': round(total_fat, 2),
-            'total_calories': round(total_calories, 2),
-            'protein_percentage': round(protein_pct, 2),
-            'carbs_percentage': round(carbs_pct, 2),
-            'fat_percentage': round(fat_pct, 2)
+            'total_protein': protein,
+            'total_carbs': carbs,
+            'total_fat': fat,
+            'total_calories': totals['calories'],
+            'protein_percentage': protein_pct,
+            'carbs_percentage': carbs_pct,
+            'fat_percentage': fat_pct
         }
     
-    def get_meal_frequency(self) -> Dict[str, int]:
-        """Get frequency of meal types"""
-        frequency = {}
-        for meal in self.meals:
-            meal_type = meal.get('mealType', 'unknown')
-            frequency[meal_type] = frequency.get(meal_type, 0) + 1
-        return frequency
-    
-    def get_daily_averages(self, days: int = 7) -> Dict[str, float]:
-        """Calculate daily averages for the last N days"""
-        cutoff_date = datetime.now() - timedelta(days=days)
-        recent_meals = [
-            meal for meal in self.meals
-            if datetime.fromisoformat(meal.get('consumedAt', '').replace('Z', '+00:00')) > cutoff_date
-        ]
-        
-        if not recent_meals:
+    @staticmethod
+    def _format_daily_averages(agg: Aggregates, days: int) -> Dict[str, float]:
+        """Build per-day averages from the aggregated recent totals"""
+        if not agg.recent_count:
             return {'calories': 0, 'protein': 0, 'carbs': 0, 'fat': 0}
         
-        total_calories = 0
-        total_protein = 0
-        total_carbs = 0
-        total_fat = 0
-        
-        for meal in recent_meals:
-            analysis = meal.get('analysisData', {})
-            totals = analysis.get('totals', {})
-            macros = totals.get('macros', {})
-            
-            total_calories += totals.get('calories_kcal', 0)
-            total_protein += macros.get('protein_g', 0)
-            total_carbs += macros.get('carbs_g', 0)
-            total_fat += macros.get('fat_g', 0)
-        
+        recent = agg.recent
         return {
-            'calories': round(total_calories / days, 2),
-            'protein': round(total_protein / days, 2),
-            'carbs': round(total_carbs / days, 2),
-            'fat': round(total_fat / days, 2)
+            'calories': recent['calories'] / days,
+            'protein': recent['protein'] / days,
+            'carbs': recent['carbs'] / days,
+            'fat': recent['fat'] / days
         }
     
-    def get_top_foods(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Get most frequently detected food items"""
-        food_count = {}
-        
-        for meal in self.meals:
-            analysis = meal.get('analysisData', {})
-            composition = analysis.get('composition', [])
-            
-            for item in composition:
-                label = item.get('label', 'unknown')
-                if label not in food_count:
-                    food_count[label] = {
-                        'count': 0,
-                        'total_calories': 0,
-                        'total_protein': 0
-                    }
-                
-                food_count[label]['count'] += 1
-                nutrition = item.get('nutrition', {})
-                food_count[label]['total_calories'] += nutrition.get('calories_kcal', 0)
-                food_count[label]['total_protein'] += nutrition.get('macros', {}).get('protein_g', 0)
-        
-        # Sort by count
-        sorted_foods = sorted(
-            food_count.items(),
-            key=lambda x: x[1]['count'],
-            reverse=True
-        )
-        
+    @staticmethod
+    def _format_top_foods(agg: Aggregates, limit: int) -> List[Dict[str, Any]]:
+        """Rank aggregated food items by how often they were detected"""
         return [
             {
                 'food': food,
-                'count': data['count'],
-                'avg_calories': round(data['total_calories'] / data['count'], 2),
-                'avg_protein': round(data['total_protein'] / data['count'], 2)
+                'count': data.count,
+                'avg_calories': data.cal / data.count,
+                'avg_protein': data.prot / data.count
             }
-            for food, data in sorted_foods[:limit]
+            for food, data in rank_foods(agg.foods, limit)
         ]
     
     def print_summary(self):
@@ -153,55 +176,59 @@ class NutritionAnalyzer:
         print("NUTRITION ANALYSIS SUMMARY")
         print("="*60)
         
-        print(f"\nTotal Meals Analyzed: {len(self.meals)}")
+        agg = self._aggregate_all(7)
+        print(f"\nTotal Meals Analyzed: {agg.meal_count}")
         
         # Macronutrient Analysis
         print("\n--- MACRONUTRIENT DISTRIBUTION ---")
-        macros = self.analyze_macros()
-        print(f"Total Calories: {macros['total_calories']} kcal")
-        print(f"Total Protein: {macros['total_protein']}g ({macros['protein_percentage']}%)")
-        print(f"Total Carbs: {macros['total_carbs']}g ({macros['carbs_percentage']}%)")
-        print(f"Total Fat: {macros['total_fat']}g ({macros['fat_percentage']}%)")
+        macros = self._format_macros(agg)
+        print(f"Total Calories: {macros['total_calories']:.2f} kcal")
+        print(f"Total Protein: {macros['total_protein']:.2f}g ({macros['protein_percentage']:.2f}%)")
+        print(f"Total Carbs: {macros['total_carbs']:.2f}g ({macros['carbs_percentage']:.2f}%)")
+        print(f"Total Fat: {macros['total_fat']:.2f}g ({macros['fat_percentage']:.2f}%)")
         
         # Meal Frequency
         print("\n--- MEAL TYPE FREQUENCY ---")
-        frequency = self.get_meal_frequency()
-        for meal_type, count in sorted(frequency.items(), key=lambda x: x[1], reverse=True):
+        for meal_type, count in sorted(agg.meal_types.items(), key=lambda x: x[1], reverse=True):
             print(f"{meal_type.capitalize()}: {count} meals")
         
         # Daily Averages
         print("\n--- 7-DAY DAILY AVERAGES ---")
-        averages = self.get_daily_averages(7)
-        print(f"Calories: {averages['calories']} kcal/day")
-        print(f"Protein: {averages['protein']}g/day")
-        print(f"Carbs: {averages['carbs']}g/day")
-        print(f"Fat: {averages['fat']}g/day")
+        averages = self._format_daily_averages(agg, 7)
+        print(f"Calories: {averages['calories']:.2f} kcal/day")
+        print(f"Protein: {averages['protein']:.2f}g/day")
+        print(f"Carbs: {averages['carbs']:.2f}g/day")
+        print(f"Fat: {averages['fat']:.2f}g/day")
         
         # Top Foods
         print("\n--- TOP 10 FOODS ---")
-        top_foods = self.get_top_foods(10)
+        top_foods = self._format_top_foods(agg, 10)
         for i, food in enumerate(top_foods, 1):
             print(f"{i}. {food['food']}: {food['count']} times "
-                  f"(avg {food['avg_calories']} kcal, {food['avg_protein']}g protein)")
+                  f"(avg {food['avg_calories']:.2f} kcal, {food['avg_protein']:.2f}g protein)")
         
         print("\n" + "="*60)
 
 
 def main():
     """Main function"""
-    if len(sys.argv) < 2:
-        print("Usage: python nutrition_analyzer.py <json_file>")
+    args = [arg for arg in sys.argv[1:] if arg != '--stream']
+    stream = len(args) < len(sys.argv) - 1
+    
+    if not args:
+        print("Usage: python nutrition_analyzer.py <json_file> [--stream]")
         print("\nExample:")
         print("  python nutrition_analyzer.py meals_data.json")
+        print("  python nutrition_analyzer.py meals_data.json --stream  (requires ijson)")
         sys.exit(1)
     
-    data_file = sys.argv[1]
+    data_file = args[0]
     
     if not Path(data_file).exists():
         print(f"✗ File not found: {data_file}")
         sys.exit(1)
     
-    analyzer = NutritionAnalyzer(data_file)
+    analyzer = NutritionAnalyzer(data_file, stream=stream)
     analyzer.print_summary()
 
 